@@ -1,30 +1,107 @@
+import bson
+import orjson
+import os
 import time
+import heapq
+import logging
+import multiprocessing
 import pymongo
 import queue
 
+from bson.raw_bson import RawBSONDocument
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dateutil import parser
-from queue import Queue
+from threading import Event, Thread
+from pymongo.errors import BulkWriteError, PyMongoError
+from pymongo.write_concern import WriteConcern
 from helpers import OANDA
 from helpers.misc import (
     load_config,
     seconds_to_human,
     seconds_to_us,
     ignore_keyboard_interrupt,
+    TerminationFlag,
     create_logger,
+    create_log_listener,
+)
+from helpers.ipc import (
+    expose_telemetry,
+    telemetry_format,
+    TelemetryManager,
+    TelemetrySnapshot,
 )
-from helpers.ipc import expose_telemetry, telemetry_format, TelemetryManager
 from helpers.balancing import LoadBalancer, AutoscalingGroup
-from multiprocessing import Manager
+from helpers.counters import SharedCounters
+from helpers.dedup import DuplicateFilter
+from helpers.ring import RingQueue
+from typing import Tuple
+
+# Per-datapoint logging and insert timing, enabled with TIDEPOOL_DEBUG=1
+DEBUG = os.environ.get("TIDEPOOL_DEBUG") == "1"
+
+# Skip collecting log record fields the log format does not use, processName is still used.
+# Set on import, so the main process and each worker, which imports this module, set it once
+logging.logThreads = False
+logging.logProcesses = False
+logging._srcfile = None
+
+
+def datapoint_key(datapoint: dict) -> str:
+    """
+    :param datapoint: Raw OANDA datapoint in dictionary format
+    :return: Returns a key identifying the datapoint, used for removing duplicates
+    :rtype: str
+    """
+    return f'{datapoint["type"]}|{datapoint.get("instrument")}|{datapoint["time"]}'
+
+
+def pack_document(dest: str, document: dict) -> bytes:
+    """
+    :param dest: Name of the collection to store the document in
+    :param document: Document to store
+    :return: Returns the destination and BSON encoded document as a single NUL separated record
+    :rtype: bytes
+    """
+    return dest.encode() + b"\0" + bson.encode(document)
 
 
-def process_datapoint(datapoint: dict) -> dict:
+def parse_time(timestamp: str) -> datetime:
+    """
+    :param timestamp: UTC timestamp in the fixed RFC 3339 format used by OANDA,
+        e.g. 2022-01-01T10:00:00.123456789Z
+    :return: Returns the timestamp as a timezone aware datetime, truncated to microseconds
+    :rtype: datetime
+    """
+    # OANDA sends nanosecond fractions, fromisoformat only accepts up to microseconds
+    if len(timestamp) == 30 and timestamp[19] == "." and timestamp[-1] == "Z":
+        return datetime.fromisoformat(timestamp[:26] + "+00:00")
+
+    # Fall back to the generic parser for anything not in OANDA's format
+    if len(timestamp) < 20 or timestamp[-1] != "Z" or timestamp[19] not in ".Z":
+        return parser.parse(timestamp)
+
+    microsecond = int(timestamp[20:-1][:6].ljust(6, "0")) if timestamp[19] == "." else 0
+    return datetime(
+        int(timestamp[0:4]),
+        int(timestamp[5:7]),
+        int(timestamp[8:10]),
+        int(timestamp[11:13]),
+        int(timestamp[14:16]),
+        int(timestamp[17:19]),
+        microsecond,
+        tzinfo=timezone.utc,
+    )
+
+
+def process_datapoint(datapoint: dict) -> Tuple[str, dict]:
     """
     :param datapoint: Raw OANDA datapoint in dictionary format
-    :return: Returns a datapoint formatted for database storage
-    :rtype: dict
+    :return: Returns the destination collection and the datapoint formatted for database storage
+    :rtype: Tuple[str, dict]
     """
     processed_datapoint = {
-        "time": parser.parse(datapoint["time"]),
+        "time": parse_time(datapoint["time"]),
         "bid": datapoint["closeoutBid"],
         "ask": datapoint["closeoutAsk"],
         "status": datapoint["status"],
@@ -32,8 +109,7 @@ def process_datapoint(datapoint: dict) -> dict:
         "instrument": datapoint["instrument"],
     }
 
-    db_packet = {"dest": datapoint["instrument"], "data": processed_datapoint}
-    return db_packet
+    return datapoint["instrument"], processed_datapoint
 
 
 class DataGatherer:
@@ -43,11 +119,7 @@ class DataGatherer:
     RECORDING_PROCESS_COUNT_MIN = 1
     RECORDING_PROCESS_COUNT_MAX = 64
 
-    PROCESSING_PROCESS_COUNT_MIN = 1
-    PROCESSING_PROCESS_COUNT_MAX = 10
-
     # Periodic action intervals (perform action every n seconds)
-    TICK_INTERVAL = 0.01
     DATA_REFRESH_INTERVAL = 60 * 10
     STATUS_INTERVAL = 5
     AUTOSCALE_INTERVAL = 0.25
@@ -57,178 +129,259 @@ class DataGatherer:
     MAX_QUEUE_SIZE = 10
     QUEUE_TIMEOUT = 0.1
 
-    def __init__(self, db_string: str, api_config: dict) -> None:
+    # Recording batch limits (flush after n datapoints or n seconds)
+    MAX_BATCH_SIZE = 500
+    BATCH_TIMEOUT = 0.05
+
+    # Threads issuing the per-collection inserts of a batch concurrently
+    INSERT_THREAD_COUNT = 16
+
+    # Worker processes are not forked from this process, which runs recorder and driver threads
+    # that may hold locks at the time of the fork
+    START_METHOD = "forkserver"
+
+    def __init__(self, db_string: str, api_config: dict, log_queue=None) -> None:
         """
         :param db_string: MongoDB database connection string
         :param api_config: API config dictionary
+        :param log_queue: Queue of the log listener shared by all workers, see create_log_listener
         :rtype: None
         """
         self.db_string = db_string
-        self.logger = create_logger()
+        self.log_queue = log_queue
+        self.logger = create_logger(log_queue)
+        self.action_time = 0
+        # Set by stop(), wakes run() immediately instead of at its next deadline
+        self.stopping = Event()
+        self.context = multiprocessing.get_context(DataGatherer.START_METHOD)
+
+        # Recorders are threads sharing this client's connection pool
+        # Batches are compressed on the wire, with zlib as a fallback for servers without zstd
+        self.client = pymongo.MongoClient(
+            db_string, connect=False, compressors="zstd,zlib"
+        )
+        self.insert_pool = ThreadPoolExecutor(
+            DataGatherer.INSERT_THREAD_COUNT, thread_name_prefix="insert"
+        )
 
-        self.manager = Manager()
-        self.latest_data = self.manager.list()
-        self.unsaved_data = self.manager.Queue()
-        self.unprocessed_data = self.manager.Queue()
+        # Objects shared with worker processes are created from the context they are started from
+        self.duplicate_filter = DuplicateFilter(context=self.context)
+        self.unsaved_data = RingQueue(context=self.context)
 
-        self.telemetry_manager = TelemetryManager(self.manager.dict(telemetry_format))
+        self.telemetry_manager = TelemetryManager(
+            TelemetrySnapshot(telemetry_format, context=self.context)
+        )
 
-        self.api_config = self.manager.dict()
-        for key, value in api_config.items():
-            self.api_config[key] = value
+        # Read-only after startup, so each gatherer receives its own copy at spawn
+        self.api_config = dict(api_config)
 
-        self.ipc = AutoscalingGroup(expose_telemetry, (self.telemetry_manager.shared_telemetry,), 1)
+        self.ipc = AutoscalingGroup(
+            expose_telemetry,
+            (self.telemetry_manager.shared_telemetry, self.log_queue),
+            1,
+            context=self.context,
+        )
 
         self.gatherers = AutoscalingGroup(
             self.gather_data,
-            (self.api_config, self.unprocessed_data),
+            (self.api_config, self.duplicate_filter, self.unsaved_data, self.log_queue),
             DataGatherer.GATHERING_PROCESS_COUNT_MIN,
-        )
-
-        self.processors = LoadBalancer(
-            self.process_data,
-            (self.latest_data, self.unsaved_data),
-            DataGatherer.PROCESSING_PROCESS_COUNT_MIN,
-            DataGatherer.PROCESSING_PROCESS_COUNT_MAX,
-            self.unprocessed_data,
-            DataGatherer.MAX_QUEUE_SIZE,
+            telemetry_keys=tuple(self.api_config["instruments"]),
+            context=self.context,
         )
 
         self.recorders = LoadBalancer(
             self.record_data,
-            (self.db_string,),
+            (self.client, self.insert_pool, self.log_queue),
             DataGatherer.RECORDING_PROCESS_COUNT_MIN,
             DataGatherer.RECORDING_PROCESS_COUNT_MAX,
             self.unsaved_data,
             DataGatherer.MAX_QUEUE_SIZE,
+            worker_type=Thread,
+            context=self.context,
         )
 
     @staticmethod
     @ignore_keyboard_interrupt
     def gather_data(
-        api_config: dict, unprocessed_queue: Queue, telemetry: dict = None
+        api_config: dict,
+        duplicate_filter: DuplicateFilter,
+        unsaved_queue: RingQueue,
+        log_queue=None,
+        telemetry: SharedCounters = None,
     ) -> None:
         """
         :param api_config: API config dictionary
-        :param unprocessed_queue: Queue for unprocessed data points
+        :param duplicate_filter: Shared record of recently gathered data points, for removing
+            duplicates
+        :param unsaved_queue: Queue for unsaved data points, packed by pack_document (used by
+            saving threads)
+        :param log_queue: Queue of the log listener
         :rtype: None
         """
-        logger = create_logger()
+        terminated = TerminationFlag()
+        logger = create_logger(log_queue)
         token = api_config["token"]
-        id = api_config["id"]
-        instruments = api_config["instruments"]
-        url = api_config["url"]
+        stream_url = api_config["stream_url"]
 
-        data = OANDA.stream_prices(token, id, instruments, url)
-        for datapoint in data:
-            unprocessed_queue.put(datapoint)
+        session = OANDA.create_session(token)
+        data = OANDA.stream_lines(token, stream_url, session)
 
-            if telemetry is not None:
-                # do telemetry...
-                telemetry["action_count"] += 1
+        # Bound once, these are called for every datapoint
+        put_unsaved = unsaved_queue.put_bytes
+        put_many_unsaved = unsaved_queue.put_many_bytes
+        seen = duplicate_filter.seen
 
-        logger.critical("Data stream closed - terminating process.")
+        # Datapoints are processed here, so they only cross one process boundary on the way
+        # to the db
+        for line in data:
+            if terminated:
+                return
 
-    @staticmethod
-    @ignore_keyboard_interrupt
-    def process_data(
-        unprocessed_queue: Queue,
-        latest_data: list,
-        unsaved_queue: Queue,
-        telemetry: dict = None,
-    ) -> None:
-        """
-        :param unprocessed_queue: Queue containing unprocessed data points
-        :param latest_data: List of recently processed data points for removing duplicates
-        :param unsaved_queue: Queue of unsaved data points (used by saving processes)
-        :rtype: None
-        """
-        logger = create_logger()
-        while True:
-            try:
-                unprocessed_datapoint = unprocessed_queue.get(
-                    timeout=DataGatherer.QUEUE_TIMEOUT
-                )
-                datapoint = unprocessed_datapoint
-                if datapoint in latest_data:
-                    continue
+            if telemetry is not None:
+                telemetry.add("action_count")
 
-                latest_data.append(datapoint)
-                if len(latest_data) > 100:
-                    latest_data.pop(0)
+            datapoint = orjson.loads(line)
+            if seen(datapoint_key(datapoint)):
+                continue
 
+            if DEBUG:
                 logger.info(f"Processing datapoint: {datapoint}")
-                # Save every datapoint
-                to_queue = {"dest": "raw", "data": datapoint}
-                unsaved_queue.put(to_queue)
-
-                # Save relevant price data in correct database
-                if datapoint["type"] == "PRICE":
-                    to_queue = process_datapoint(datapoint)
-                    unsaved_queue.put(to_queue)
-
-                    if telemetry is not None:
-                        telemetry["action_count"] += 1
-
-                        instrument = to_queue['dest']
+            # Documents are encoded to BSON here, so recorders hand them straight to the driver
+            # Save every datapoint
+            raw_record = pack_document("raw", datapoint)
+
+            # Save relevant price data in correct database
+            if datapoint["type"] == "PRICE":
+                instrument, processed_datapoint = process_datapoint(datapoint)
+                # Both records of a price are queued together, taking the queue lock once
+                put_many_unsaved(
+                    (raw_record, pack_document(instrument, processed_datapoint))
+                )
 
-                        if instrument in telemetry:
-                            telemetry[instrument] += 1
-                        else:
-                            telemetry[instrument] = 1
+                if telemetry is not None and instrument in telemetry:
+                    telemetry.add(instrument)
+            else:
+                put_unsaved(raw_record)
 
-            except queue.Empty:
-                logger.debug("Unprocessed queue is empty.")
+        logger.critical("Data stream closed - terminating process.")
 
     @staticmethod
-    @ignore_keyboard_interrupt
     def record_data(
-        unsaved_queue: Queue, db_string: str, telemetry: dict = None
+        unsaved_queue: RingQueue,
+        client: pymongo.MongoClient,
+        insert_pool: ThreadPoolExecutor,
+        log_queue=None,
+        telemetry: SharedCounters = None,
+        *,
+        stop_event: Event,
     ) -> None:
         """
-        :param unsaved_queue: Queue containing unsaved datapoints
-        :param db_string: MongoDB connection string
+        :param unsaved_queue: Queue containing unsaved datapoints, packed by pack_document
+        :param client: MongoDB client shared by all recording threads
+        :param insert_pool: Executor used to insert into each collection of a batch concurrently
+        :param log_queue: Queue of the log listener
+        :param stop_event: Event set when the recording thread should return
         :rtype: None
         """
-        logger = create_logger()
-        client = pymongo.MongoClient(db_string)
+        logger = create_logger(log_queue)
         tidepooldb = client["tidepool"]
-        raw = tidepooldb["raw"]
-
-        while True:
+        # Raw captures are fire-and-forget, don't wait for acknowledgement
+        raw = tidepooldb.get_collection("raw", write_concern=WriteConcern(w=0))
+        # Collection handles by destination, pymongo builds a new Collection on every lookup
+        collections = {b"raw": raw}
+        get_unsaved = unsaved_queue.get_many_bytes
+        max_batch_size = DataGatherer.MAX_BATCH_SIZE
+
+        # Finish the current batch before returning when stopped by the autoscaler
+        while not stop_event.is_set():
+            # Block until there is data, the batch window only opens with the first datapoint
             try:
-                datapoint = unsaved_queue.get(timeout=DataGatherer.QUEUE_TIMEOUT)
-
-                if datapoint is None:
-                    logger.error("'NoneType' datapoint found in unsaved queue.")
-                    continue
-
-                if datapoint["dest"] == "raw":
-                    raw.insert_one(datapoint["data"])
-
-                else:
-                    logger.info("Inserting data point into db...")
-                    start = time.time_ns()
-                    tidepooldb[datapoint["dest"]].insert_one(datapoint["data"])
-                    elapsed = (time.time_ns() - start) / 1000
-                    logger.info(f"Successfully inserted data point in {elapsed}μs")
+                records = get_unsaved(
+                    max_batch_size, timeout=DataGatherer.QUEUE_TIMEOUT
+                )
+            except queue.Empty:
+                # Idle, this fires every QUEUE_TIMEOUT so it is not logged
+                continue
+
+            batch = {}
+            batch_size = 0
+            deadline = time.monotonic() + DataGatherer.BATCH_TIMEOUT
+
+            while True:
+                for record in records:
+                    dest, _, data = record.partition(b"\0")
+                    batch.setdefault(dest, []).append(RawBSONDocument(data))
+                batch_size += len(records)
+
+                timeout = deadline - time.monotonic()
+                if batch_size >= max_batch_size or timeout <= 0:
+                    break
+
+                try:
+                    records = get_unsaved(max_batch_size - batch_size, timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if DEBUG:
+                logger.info(f"Inserting {batch_size} data points into db...")
+                start = time.time_ns()
+
+            # Overlap the round-trips to each collection instead of waiting on them in turn
+            inserts = []
+            for dest, documents in batch.items():
+                collection = collections.get(dest)
+                if collection is None:
+                    collection = collections[dest] = tidepooldb[dest.decode()]
+                inserts.append(
+                    (
+                        dest,
+                        len(documents),
+                        insert_pool.submit(
+                            collection.insert_many, documents, ordered=False
+                        ),
+                    )
+                )
 
-                if telemetry is not None:
-                    telemetry["action_count"] += 1
+            # A failed insert only loses its own documents, the rest of the batch is still recorded
+            for dest, document_count, insert in inserts:
+                try:
+                    insert.result()
+                except BulkWriteError as error:
+                    failed_count = len(error.details["writeErrors"])
+                    batch_size -= failed_count
+                    logger.error(
+                        f"Failed to insert {failed_count} data points into {dest.decode()}: "
+                        f"{error.details['writeErrors'][0]['errmsg']}"
+                    )
+                except PyMongoError as error:
+                    batch_size -= document_count
+                    logger.error(
+                        f"Failed to insert {document_count} data points into {dest.decode()}: "
+                        f"{error}"
+                    )
+
+            if DEBUG:
+                elapsed = (time.time_ns() - start) / 1000
+                logger.info(
+                    f"Successfully inserted {batch_size} data points in {elapsed}μs"
+                )
 
-            except queue.Empty:
-                logger.debug("Unsaved queue is empty.")
+            if telemetry is not None:
+                telemetry.add("action_count", batch_size)
 
     def update_telemetry(self, uptime: float):
         self.telemetry_manager.update_data_stats(
-            self.gatherers, self.processors, self.recorders, DataGatherer.UPDATE_TELEMETRY_INTERVAL
+            self.gatherers, self.recorders, DataGatherer.UPDATE_TELEMETRY_INTERVAL
         )
 
         self.telemetry_manager.update_server_stats(
-            self.gatherers, self.processors, self.recorders, self.unsaved_data, self.unprocessed_data, uptime
+            self.gatherers, self.recorders, self.unsaved_data, uptime
         )
 
-        self.telemetry_manager.update_instrument_stats(self.processors, DataGatherer.UPDATE_TELEMETRY_INTERVAL)
+        self.telemetry_manager.update_instrument_stats(
+            self.gatherers, DataGatherer.UPDATE_TELEMETRY_INTERVAL
+        )
 
         self.telemetry_manager.update_shared_telemetry()
 
@@ -238,103 +391,163 @@ class DataGatherer:
         """
         self.ipc.autoscale()
         self.gatherers.autoscale()
-        self.processors.autoscale()
         self.recorders.autoscale()
 
-    def run(self) -> None:
+    def log_status(self, uptime: float) -> None:
         """
+        :param uptime: Number of seconds since the data gatherer started running
         :rtype: None
         """
-        self.ipc.start()
-        self.gatherers.start()
-        self.processors.start()
-        self.recorders.start()
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
 
-        tick_count = 1
-        tick_time = 0
-        while True:
-            tick_start = time.time()
-            uptime = tick_count * DataGatherer.TICK_INTERVAL
-
-            gathering_proc_count = self.gatherers.proc_count()
-            processing_proc_count = self.processors.proc_count()
-            recording_proc_count = self.recorders.proc_count()
+        proc_count_message = (
+            f"# Subprocesses: [Gathering: {self.gatherers.proc_count()} | "
+            f"Recording: {self.recorders.proc_count()}]"
+        )
+        queue_size_message = (
+            f"Queue Sizes (current | avg): "
+            f"[Unsaved: ({self.unsaved_data.qsize()} | {self.recorders.queue_average:.2f})]"
+        )
+        timing_message = (
+            f"Timing: [Uptime: {seconds_to_human(int(uptime))} | "
+            f"Previous Action Time: {seconds_to_us(self.action_time)}µs]"
+        )
 
-            if uptime % DataGatherer.AUTOSCALE_INTERVAL == 0:
-                self.autoscale()
+        self.logger.warning(proc_count_message)
+        self.logger.warning(queue_size_message)
+        self.logger.warning(timing_message)
 
-            if uptime % DataGatherer.STATUS_INTERVAL == 0:
-                proc_count_message = (
-                    f"# Subprocesses: [Gathering: {gathering_proc_count} | "
-                    f"Processing: {processing_proc_count} | "
-                    f"Recording: {recording_proc_count}]"
-                )
-                queue_size_message = (
-                    f"Queue Sizes (current | avg): "
-                    f"[Unprocessed: ({self.unprocessed_data.qsize()} | {self.processors.queue_average:.2f}) | "
-                    f"Unsaved: ({self.unsaved_data.qsize()} | {self.recorders.queue_average:.2f})]"
-                )
-                timing_message = f"Timing: [Uptime: {seconds_to_human(uptime)} | Previous Tick Time: {seconds_to_us(tick_time)}µs]"
+    def ensure_indexes(self) -> None:
+        """
+        Indexes every instrument collection on time. Prices arrive in time order, so each insert
+        only appends to the right edge of the index. The raw collection is left unindexed.
 
-                self.logger.warning(proc_count_message)
-                self.logger.warning(queue_size_message)
-                self.logger.warning(timing_message)
+        :rtype: None
+        """
+        tidepooldb = self.client["tidepool"]
+        try:
+            for instrument in self.api_config["instruments"]:
+                tidepooldb[instrument].create_index([("time", pymongo.ASCENDING)])
 
-            if uptime % DataGatherer.DATA_REFRESH_INTERVAL == 0:
-                self.gatherers.refresh_procs()
+        # The index only speeds up reads, gathering must not depend on it
+        except PyMongoError as error:
+            self.logger.warning(
+                f"Could not create time indexes, continuing without them: {error}"
+            )
 
-            if uptime % DataGatherer.UPDATE_TELEMETRY_INTERVAL == 0:
-                self.update_telemetry(uptime)
+    def run(self) -> None:
+        """
+        :rtype: None
+        """
+        self.ipc.start()
+        self.gatherers.start()
+        self.recorders.start()
 
-            tick_time = time.time() - tick_start
-            sleep_time = DataGatherer.TICK_INTERVAL - tick_time
-            sleep_time = 0 if sleep_time < 0 else sleep_time
-            time.sleep(sleep_time)
-            tick_count += 1
+        # Building an index on a large existing collection can take minutes, don't hold up
+        # gathering for it
+        Thread(target=self.ensure_indexes, name="ensure_indexes", daemon=True).start()
+
+        start = time.monotonic()
+        periodic_actions = [
+            (DataGatherer.AUTOSCALE_INTERVAL, self.autoscale),
+            (
+                DataGatherer.STATUS_INTERVAL,
+                lambda: self.log_status(time.monotonic() - start),
+            ),
+            (DataGatherer.DATA_REFRESH_INTERVAL, self.gatherers.refresh_procs),
+            (
+                DataGatherer.UPDATE_TELEMETRY_INTERVAL,
+                lambda: self.update_telemetry(time.monotonic() - start),
+            ),
+        ]
+
+        # Min-heap of (deadline, index, interval, action), the next action due is always first
+        schedule = [
+            (start + interval, index, interval, action)
+            for index, (interval, action) in enumerate(periodic_actions)
+        ]
+        heapq.heapify(schedule)
+
+        while not self.stopping.is_set():
+            deadline, index, interval, action = schedule[0]
+            sleep_time = deadline - time.monotonic()
+            if sleep_time > 0 and self.stopping.wait(sleep_time):
+                break
+
+            action_start = time.monotonic()
+            action()
+            now = time.monotonic()
+            self.action_time = now - action_start
+
+            # Skip deadlines missed while running a slow action instead of bursting to catch up
+            heapq.heapreplace(
+                schedule, (max(deadline + interval, now), index, interval, action)
+            )
 
     def stop(self) -> None:
         """
         :rtype: None
         """
+        self.stopping.set()
+
         self.gatherers.stop()
-        self.processors.stop()
         self.recorders.stop()
+        self.insert_pool.shutdown()
+
+        self.unsaved_data.close()
+        self.client.close()
 
 
 def main() -> None:
     """
     :rtype: None
     """
-    logger = create_logger()
-    logger.info("Starting data collection.")
-
-    cfg = load_config()
-    token = cfg["token"]
-    alias = cfg["alias"]
-    db_string = cfg["db_string"]
-    live = cfg["live"]
-
-    api = OANDA.API(token, live=live)
-    account = api.get_account(alias)
-    if not account:
-        print("Error connecting to ")
-    instruments = api.get_instruments(alias)
-
-    api_config = {
-        "url": api.stream_url,
-        "token": token,
-        "id": account["id"],
-        "instruments": instruments,
-    }
+    # Workers only queue log records, this listener is the single writer to the log file
+    log_listener = create_log_listener(
+        multiprocessing.get_context(DataGatherer.START_METHOD)
+    )
+    log_listener.start()
 
-    dg = DataGatherer(db_string=db_string, api_config=api_config)
+    # The listener writes records on its own thread, stop it however startup or run() is left
     try:
-        dg.run()
+        logger = create_logger(log_listener.queue)
+        logger.info("Starting data collection.")
+
+        cfg = load_config()
+        token = cfg["token"]
+        alias = cfg["alias"]
+        db_string = cfg["db_string"]
+        live = cfg["live"]
+
+        api = OANDA.API(token, live=live)
+        account = api.get_account(alias)
+        if not account:
+            print("Error connecting to ")
+        instruments = api.get_instruments(alias)
+
+        # The stream URL is built once here, gatherers connect to it as is
+        api_config = {
+            "stream_url": OANDA.pricing_stream_url(
+                account["id"], instruments, api.stream_url
+            ),
+            "token": token,
+            "instruments": instruments,
+        }
+
+        dg = DataGatherer(
+            db_string=db_string, api_config=api_config, log_queue=log_listener.queue
+        )
+        try:
+            dg.run()
+
+        except KeyboardInterrupt:
+            logger.critical("KeyboardInterrupt, stopping data collection.")
+            dg.stop()
+            quit(0)
 
-    except KeyboardInterrupt:
-        logger.critical("KeyboardInterrupt, stopping data collection.")
-        dg.stop()
-        quit(0)
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":
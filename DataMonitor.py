@@ -3,6 +3,7 @@ import sys
 import datetime
 import pymongo
 
+from concurrent.futures import ThreadPoolExecutor
 from helpers.misc import load_config
 
 
@@ -24,6 +25,11 @@ def progress_bar(i: int, total: int, post_text: str, n: int = 10) -> None:
 class DataMonitor:
     RUN_INTERVAL = 60
 
+    # Threads used to count collections concurrently
+    COUNT_THREAD_COUNT = 16
+    # Seconds the instrument list is reused before the collections are listed again
+    INSTRUMENTS_TTL = 300
+
     def __init__(self, db_string: str) -> None:
         """
         :param db_string: MongoDB connection string
@@ -33,14 +39,28 @@ class DataMonitor:
         self.client = pymongo.MongoClient(db_string)
         self.data_db = self.client["tidepool"]
         self.stats_db = self.client["tidepool-stats"]
+        self.count_pool = ThreadPoolExecutor(DataMonitor.COUNT_THREAD_COUNT)
+
+        self._instruments = None
+        self._instruments_time = 0.0
 
     def get_instruments(self) -> list:
         """
+        :return: Returns the instrument collections, listed at most once every
+            INSTRUMENTS_TTL seconds
         :rtype: list
         """
-        collections = self.data_db.list_collection_names()
-        collections.remove("raw")
-        return collections
+        now = time.monotonic()
+        if (
+            self._instruments is None
+            or now - self._instruments_time >= DataMonitor.INSTRUMENTS_TTL
+        ):
+            self._instruments = self.data_db.list_collection_names(
+                filter={"name": {"$ne": "raw"}}
+            )
+            self._instruments_time = now
+
+        return list(self._instruments)
 
     def data_count(self, instrument: str) -> int:
         """
@@ -49,7 +69,17 @@ class DataMonitor:
         :rtype: int
         """
         collection = self.data_db[instrument]
-        return collection.count_documents({})
+        # Read from collection metadata instead of scanning every document
+        return collection.estimated_document_count()
+
+    def data_counts(self, instruments: list) -> dict:
+        """
+        :param instruments: Instruments to get data counts of
+        :return: Returns dictionary with keys instrument and values datapoint counts, counted
+            concurrently
+        :rtype: dict
+        """
+        return dict(zip(instruments, self.count_pool.map(self.data_count, instruments)))
 
     def total_data_count(self) -> int:
         """
@@ -74,15 +104,11 @@ class DataMonitor:
     def profile_total(self, time_span: int) -> dict:
         """
         :param time_span: Time span to profile instruments for
-        :return: Returns dictionary with keys instrument and values data speeds
+        :return: Returns dictionary with "speeds" and "counts", each keyed by instrument
         :rtype: dict
         """
         print("Gathering intial data...", end="")
-        initial = {}
-        for instrument in self.get_instruments():
-            initial[instrument] = self.data_count(instrument)
-
-        initial["raw"] = self.total_data_count()
+        initial = self.data_counts(self.get_instruments() + ["raw"])
         print("done")
 
         for i in range(time_span):
@@ -91,27 +117,31 @@ class DataMonitor:
         print("done")
 
         print("Gathering new data...", end="")
-        gain = {}
-        for instrument in initial:
-            gain[instrument] = self.data_count(instrument) - initial[instrument]
+        final = self.data_counts(list(initial))
+        gain = {
+            instrument: final[instrument] - initial[instrument]
+            for instrument in initial
+        }
 
         speeds = {instrument: gain[instrument] / time_span for instrument in gain}
         print("done")
-        return speeds
+        return {"speeds": speeds, "counts": final}
 
     def log_profile(self, profile: dict) -> None:
         """
-        :param profile: Dictionary containing instrument name keys and data speed values
+        :param profile: Profile returned by profile_total, with data speeds and counts keyed by
+            instrument
         :rtype: None
         """
         latest = self.stats_db["latest"]
         historical = self.stats_db["historical"]
         timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat()
-        for key, value in profile.items():
+        counts = profile["counts"]
+        for key, value in profile["speeds"].items():
             stats = {
                 "instrument": key,
                 "data_rate": value,
-                "count": self.data_count(key),
+                "count": counts[key],
                 "timestamp": timestamp,
             }
             latest.update_one({"instrument": key}, {"$set": stats}, upsert=True)
@@ -124,7 +154,7 @@ class DataMonitor:
         while True:
             profile = self.profile_total(DataMonitor.RUN_INTERVAL)
             self.log_profile(profile)
-            print(f"Profiled {len(profile.keys())} currency pairs.")
+            print(f"Profiled {len(profile['speeds'])} currency pairs.")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,64 @@
-import json
+import orjson
 import time
 import requests
 
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from typing import Generator, Optional
 
+# Bytes read from the stream at a time, the stream is chunked so reads return once a
+# message arrives
+STREAM_CHUNK_SIZE = 8192
+
+
+def create_session(token: str, pool_size: int = 1) -> requests.Session:
+    """
+    :param token: Authorization token for OANDA account
+    :param pool_size: Number of connections kept alive, the number of requests made concurrently
+    :return: Returns an authorized keep-alive session, for reuse across requests
+    :rtype: requests.Session
+    """
+    session = requests.Session()
+    session.headers.update({"Authorization": f"Bearer {token}"})
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+    return session
+
+
+def pricing_stream_url(
+    id: str,
+    instruments: list,
+    url: str = "https://stream-fxpractice.oanda.com",
+) -> str:
+    """
+    :param id: OANDA account ID
+    :param instruments: List of instruments to stream prices for
+    :param url: URL to stream prices from
+    :return: Returns the full URL of the pricing stream for the given instruments
+    :rtype: str
+    """
+    return f'{url}/v3/accounts/{id}/pricing/stream?instruments={",".join(instruments)}'
+
+
+def stream_lines(
+    token: str,
+    stream_url: str,
+    session: Optional[requests.Session] = None,
+) -> Generator[bytes, None, None]:
+    """
+    :param token: Authorization token for OANDA account
+    :param stream_url: Full URL of the pricing stream, see pricing_stream_url
+    :param session: Session to stream with, see create_session
+    :return: Returns a generator for undecoded JSON datapoints
+    :rtype: Generator[bytes]
+    """
+    if session is None:
+        session = create_session(token)
+
+    with session.get(stream_url, stream=True) as resp:
+        for line in resp.iter_lines(chunk_size=STREAM_CHUNK_SIZE):
+            if line:
+                yield line
+
 
 def stream_prices(
     token: str,
@@ -18,19 +73,14 @@ def stream_prices(
     :param url: URL to stream prices from
     :rtype: dict
     """
-
-    headers = {"Authorization": f"Bearer {token}"}
-    request_url = f'{url}/v3/accounts/{id}/pricing/stream?instruments={"".join([instrument + "," for instrument in instruments])}'
-
-    with requests.get(request_url, headers=headers, stream=True) as resp:
-        for line in resp.iter_lines():
-            if line:
-                datapoint = json.loads(line.decode("utf-8"))
-                yield datapoint
+    for line in stream_lines(token, pricing_stream_url(id, instruments, url)):
+        yield orjson.loads(line)
 
 
 class API:
     REFRESH_INTERVAL = 10
+    # Subaccount details fetched concurrently
+    ACCOUNT_THREAD_COUNT = 8
 
     def __init__(self, token: str, live: bool = False) -> None:
         """
@@ -49,6 +99,8 @@ class API:
             if live
             else "https://stream-fxpractice.oanda.com"
         )
+        # One kept-alive connection per concurrent subaccount request
+        self.session = create_session(token, API.ACCOUNT_THREAD_COUNT)
         self.accounts = self.get_accounts()
 
         self.last_refresh = time.time()
@@ -59,23 +111,34 @@ class API:
         :rtype: list
         """
         endpoint = f"{self.url}/v3/accounts"
-        headers = {"Authorization": f"Bearer {self.token}"}
 
-        r = requests.get(endpoint, headers=headers)
+        # Each response body is parsed once, r.json() decodes the body again on every call
+        accounts_list = self.session.get(endpoint).json()
+
+        if "errorMessage" in accounts_list:
+            return accounts_list["errorMessage"]
 
-        if "errorMessage" in r.json().keys():
-            return r.json()["errorMessage"]
+        def get_account_details(account: dict) -> dict:
+            return self.session.get(f'{endpoint}/{account["id"]}').json()
 
         try:
-            accounts = []
-            for account in r.json()["accounts"]:
-                r = requests.get(f'{endpoint}/{account["id"]}', headers=headers)
-                accounts.append(r.json()["account"])
+            # The accounts list only has IDs and tags, the alias is in each account's details
+            with ThreadPoolExecutor(API.ACCOUNT_THREAD_COUNT) as pool:
+                account_details = list(
+                    pool.map(get_account_details, accounts_list["accounts"])
+                )
 
-            return accounts
+        except KeyError:
+            print(accounts_list)
+            raise
+
+        try:
+            return [details["account"] for details in account_details]
 
         except KeyError:
-            print(r.json())
+            print(
+                next(details for details in account_details if "account" not in details)
+            )
             raise
 
     def get_account(self, alias: str) -> dict:
@@ -86,6 +149,7 @@ class API:
         """
         if self.last_refresh < (time.time() - API.REFRESH_INTERVAL):
             self.accounts = self.get_accounts()
+            self.last_refresh = time.time()
 
         for account in self.accounts:
             if account["alias"] == alias:
@@ -112,11 +176,10 @@ class API:
         id = self.get_account(alias)["id"]
 
         endpoint = f"{self.url}/v3/accounts/{id}/instruments"
-        headers = {"Authorization": f"Bearer {self.token}"}
 
-        r = requests.get(endpoint, headers=headers)
+        body = self.session.get(endpoint).json()
 
-        if "errorMessage" in r.json():
+        if "errorMessage" in body:
             return None
 
-        return [instrument["name"] for instrument in r.json()["instruments"]]
+        return [instrument["name"] for instrument in body["instruments"]]
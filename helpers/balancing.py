@@ -1,50 +1,93 @@
+from .counters import SharedCounters
 from .misc import moving_average
-from multiprocessing import Process, Manager
+from collections import deque
+import multiprocessing
+import time
+
+from multiprocessing import Process
+from multiprocessing.context import BaseContext
+from multiprocessing.connection import wait
 from queue import Queue
-from typing import Callable
+from threading import Event, Thread
+from typing import Callable, Iterable, List, Optional, Union
 
 
 class AutoscalingGroup:
-    def __init__(self, target: Callable, args: tuple, min_process_count: int) -> None:
+    # Seconds a terminated process is given to exit before it is killed
+    STOP_TIMEOUT = 2
+
+    def __init__(
+        self,
+        target: Callable,
+        args: tuple,
+        min_process_count: int,
+        worker_type: type = Process,
+        telemetry_keys: tuple = (),
+        context: Optional[BaseContext] = None,
+    ) -> None:
         """
         :param target: Callable object to run in parallel
         :param args: Arguments to pass to target
         :param min_process_count: Minimum number of processes to maintain simultaneously
+        :param worker_type: Process, or Thread for I/O bound targets. Thread targets receive a
+            stop_event keyword argument and must return once it is set.
+        :param telemetry_keys: Names of counters kept for the target in addition to action_count
+        :param context: Multiprocessing context processes are started from, shared objects in
+            args must be created from the same context
         :rtype: None
         """
         self.target = target
         self.args = args
         self.min_process_count = min_process_count
+        self.worker_type = worker_type
+        self.context = context or multiprocessing.get_context()
 
-        self.telemetry = Manager().dict({
-            'action_count': 0
-        })
+        self.telemetry = SharedCounters(("action_count", *telemetry_keys), self.context)
 
-        self.processes = []
+        # Oldest first, downscaling stops the oldest process
+        self.processes = deque()
+        self._stop_events = {}
 
     def refresh_procs(self) -> None:
         """
+        Replaces every process, starting the replacements before stopping the old processes
+        so the group never runs below its current size.
+
         :rtype: None
         """
-        for _ in range(self.proc_count()):
-            self._downscale()
+        old_processes = self.processes
+        self.processes = deque()
+
+        for _ in range(len(old_processes)):
             self._upscale()
 
-    def _create_proc(self) -> Process:
+        self._stop(old_processes)
+
+    def _create_proc(self) -> Union[Process, Thread]:
         """
-        :return: Returns a multiprocessing Process instance
-        :rtype: Process
+        :return: Returns a multiprocessing Process or Thread instance, depending on worker type
+        :rtype: Union[Process, Thread]
         """
-        process = Process(target=self.target, args=self.args, kwargs={'telemetry': self.telemetry})
+        kwargs = {"telemetry": self.telemetry}
+        if self.worker_type is Thread:
+            kwargs["stop_event"] = Event()
+
+        worker_type = Thread if self.worker_type is Thread else self.context.Process
+        process = worker_type(target=self.target, args=self.args, kwargs=kwargs)
         process.daemon = True
+
+        if self.worker_type is Thread:
+            self._stop_events[process] = kwargs["stop_event"]
+
         return process
 
     def stop(self) -> None:
         """
         :rtype: None
         """
-        while self.proc_count() > 0:
-            self._downscale()
+        processes = self.processes
+        self.processes = deque()
+        self._stop(processes)
 
     def start(self) -> None:
         """
@@ -76,18 +119,67 @@ class AutoscalingGroup:
         """
         :rtype: None
         """
-        downscale_process = self.processes.pop(0)
-        downscale_process.terminate()
-        downscale_process.join()
+        self._stop([self.processes.popleft()])
+
+    def _stop(self, processes: Iterable[Union[Process, Thread]]) -> None:
+        """
+        Signals every process to stop before waiting on any of them, so stopping N processes
+        takes at most STOP_TIMEOUT rather than N times it.
+
+        :param processes: Processes or Threads of this group to stop
+        :rtype: None
+        """
+        processes = list(processes)
+
+        if self.worker_type is Thread:
+            # Threads cannot be terminated, ask the targets to return instead
+            for process in processes:
+                self._stop_events.pop(process).set()
+            for process in processes:
+                process.join()
+            return
+
+        for process in processes:
+            process.terminate()
+
+        deadline = time.monotonic() + AutoscalingGroup.STOP_TIMEOUT
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+
+        # A process stuck outside the interpreter never handles SIGTERM, don't wait on it forever
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def _dead_procs(self) -> List[Union[Process, Thread]]:
+        """
+        :return: Returns the processes of this group which have exited
+        :rtype: List[Union[Process, Thread]]
+        """
+        if self.worker_type is Thread:
+            return [process for process in self.processes if not process.is_alive()]
+
+        # A sentinel becomes ready once its process exits, one poll covers every process
+        sentinels = {process.sentinel: process for process in self.processes}
+        return [sentinels[sentinel] for sentinel in wait(list(sentinels), timeout=0)]
 
     def _autoscale_minimum(self) -> None:
         """
         :rtype: None
         """
-        dead = [process for process in self.processes if not process.is_alive()]
+        dead = self._dead_procs()
 
-        for process in dead:
-            self.processes.remove(process)
+        if dead:
+            for process in dead:
+                # Reap the exited process, is_alive() used to do this implicitly
+                process.join()
+                self._stop_events.pop(process, None)
+
+            dead = set(dead)
+            self.processes = deque(
+                process for process in self.processes if process not in dead
+            )
 
         while len(self.processes) < self.min_process_count:
             # self.logger.warning('Missing process, creating new process.')
@@ -101,14 +193,22 @@ class AutoscalingGroup:
 
 
 class LoadBalancer(AutoscalingGroup):
+    # Weight of the newest queue size in the smoothed queue size
+    QUEUE_SMOOTHING = 0.3
+    # Consecutive autoscales the smoothed queue size must stay out of range for before scaling
+    HYSTERESIS_COUNT = 4
+
     def __init__(
         self,
-            target: Callable,
-            args: tuple,
-            min_process_count: int,
-            max_process_count: int,
-            load_queue: Queue,
-            max_queue_size: int,
+        target: Callable,
+        args: tuple,
+        min_process_count: int,
+        max_process_count: int,
+        load_queue: Queue,
+        max_queue_size: int,
+        worker_type: type = Process,
+        telemetry_keys: tuple = (),
+        context: Optional[BaseContext] = None,
     ) -> None:
         """
         :param target: Callable object to run in parallel
@@ -117,45 +217,65 @@ class LoadBalancer(AutoscalingGroup):
         :param max_process_count: Maximum number of processes to maintain simultaneously
         :param load_queue: Queue object that contains load objects for target object
         :param max_queue_size: Maximum number of load objects in queue before increasing pool size
+        :param worker_type: Process, or Thread for I/O bound targets (see AutoscalingGroup)
+        :param telemetry_keys: Names of counters kept for the target in addition to action_count
+        :param context: Multiprocessing context processes are started from (see AutoscalingGroup)
         :rtype: None
         """
-        super().__init__(target, args, min_process_count)
+        super().__init__(
+            target, args, min_process_count, worker_type, telemetry_keys, context
+        )
 
         self.args = (load_queue, *args)
         self.load_queue = load_queue
         self.max_process_count = max_process_count
         self.max_queue_size = max_queue_size
 
-        self._previous_queue_size = 0
         self.queue_average = 0
+        self.smoothed_queue_size = 0.0
         self._autoscale_count = 0
+        self._over_count = 0
+        self._under_count = 0
 
     def _load_balance(self) -> None:
         """
+        Scales on the smoothed queue size, only once it has stayed above max_queue_size (or below
+        half of it) for HYSTERESIS_COUNT autoscales in a row, so single spikes do not cause churn.
+
         :rtype: None
         """
-        current_queue_size = self.load_queue.qsize()
-        queue_growth = (current_queue_size - self._previous_queue_size) > 0
+        if self.smoothed_queue_size > self.max_queue_size:
+            self._over_count += 1
+            self._under_count = 0
+        elif self.smoothed_queue_size < self.max_queue_size / 2:
+            self._under_count += 1
+            self._over_count = 0
+        else:
+            self._over_count = 0
+            self._under_count = 0
 
-        exceeded_max_queue = current_queue_size > self.max_queue_size
-
-        if exceeded_max_queue and (self.proc_count() < self.max_process_count):
-            # self.logger.debug("Max queue size exceeded.")
-            self._upscale()
+        if self._over_count >= LoadBalancer.HYSTERESIS_COUNT:
+            # Add a process for every multiple of max_queue_size queued
+            step = max(int(self.smoothed_queue_size // self.max_queue_size), 1)
+            for _ in range(min(step, self.max_process_count - self.proc_count())):
+                self._upscale()
+            self._over_count = 0
 
         if (
-            not exceeded_max_queue
-            and not queue_growth
+            self._under_count >= LoadBalancer.HYSTERESIS_COUNT
             and self.proc_count() > self.min_process_count
         ):
             self._downscale()
+            self._under_count = 0
 
-    def _telemetry(self) -> None:
+    def _telemetry(self, current_queue_size: int) -> None:
         """
+        :param current_queue_size: Number of load objects currently in queue
         :rtype: None
         """
-        current_queue_size = self.load_queue.qsize()
-        self._previous_queue_size = current_queue_size
+        self.smoothed_queue_size += LoadBalancer.QUEUE_SMOOTHING * (
+            current_queue_size - self.smoothed_queue_size
+        )
         self.queue_average = moving_average(
             self.queue_average, current_queue_size, self._autoscale_count
         )
@@ -165,6 +285,8 @@ class LoadBalancer(AutoscalingGroup):
         """
         :rtype: None
         """
+        current_queue_size = self.load_queue.qsize()
+
         self._autoscale_minimum()
+        self._telemetry(current_queue_size)
         self._load_balance()
-        self._telemetry()
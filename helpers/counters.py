@@ -0,0 +1,60 @@
+import multiprocessing
+
+from multiprocessing.context import BaseContext
+from typing import Iterable, List, Optional, Tuple
+
+
+class SharedCounters:
+    def __init__(
+        self, keys: Iterable[str], context: Optional[BaseContext] = None
+    ) -> None:
+        """
+        Fixed set of named counters held in shared memory, shared between processes and
+        threads. Incrementing a counter takes a lock in the calling process instead of a
+        round-trip to a Manager server.
+
+        :param keys: Names of the counters
+        :param context: Multiprocessing context of the processes sharing the counters
+        :rtype: None
+        """
+        self.keys = tuple(dict.fromkeys(keys))
+        self._index = {key: index for index, key in enumerate(self.keys)}
+        self._values = (context or multiprocessing.get_context()).Array(
+            "Q", len(self.keys)
+        )
+
+    def add(self, key: str, amount: int = 1) -> None:
+        """
+        :param key: Name of the counter to increment
+        :param amount: Amount to increment the counter by
+        :rtype: None
+        """
+        index = self._index[key]
+        with self._values.get_lock():
+            self._values[index] += amount
+
+    def __contains__(self, key: str) -> bool:
+        """
+        :param key: Name of a counter
+        :return: Returns whether a counter exists with the given name
+        :rtype: bool
+        """
+        return key in self._index
+
+    def __getitem__(self, key: str) -> int:
+        """
+        :param key: Name of the counter to read
+        :return: Returns the current value of the counter
+        :rtype: int
+        """
+        return self._values[self._index[key]]
+
+    def items(self) -> List[Tuple[str, int]]:
+        """
+        :return: Returns a snapshot of every counter as (name, value) pairs
+        :rtype: List[Tuple[str, int]]
+        """
+        with self._values.get_lock():
+            values = self._values[:]
+
+        return list(zip(self.keys, values))
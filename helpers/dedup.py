@@ -0,0 +1,55 @@
+import hashlib
+import multiprocessing
+
+from multiprocessing.context import BaseContext
+from typing import Optional
+
+
+class DuplicateFilter:
+    WAYS = 4
+
+    def __init__(self, size: int = 4096, context: Optional[BaseContext] = None) -> None:
+        """
+        Bounded record of recently seen keys, shared between processes. Keys are hashed
+        into a set-associative table held in shared memory, so checking a key is O(1)
+        and never leaves the calling process.
+
+        :param size: Number of recent keys to remember
+        :param context: Multiprocessing context of the processes sharing the filter
+        :rtype: None
+        """
+        self.buckets = max(size // DuplicateFilter.WAYS, 1)
+        self.table = (context or multiprocessing.get_context()).Array(
+            "Q", self.buckets * DuplicateFilter.WAYS
+        )
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        """
+        :param key: Key to hash
+        :return: Returns a non-zero 64-bit hash which is stable across processes
+        :rtype: int
+        """
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def seen(self, key: str) -> bool:
+        """
+        :param key: Key identifying a datapoint
+        :return: Returns True if the key was seen recently, otherwise records it and returns False
+        :rtype: bool
+        """
+        key_hash = self._hash(key)
+        start = (key_hash % self.buckets) * DuplicateFilter.WAYS
+        end = start + DuplicateFilter.WAYS
+
+        with self.table.get_lock():
+            table = self.table.get_obj()
+            if key_hash in table[start:end]:
+                return True
+
+            # Evict the oldest key in the bucket
+            table[start + 1 : end] = table[start : end - 1]
+            table[start] = key_hash
+
+        return False
@@ -1,120 +1,142 @@
+import os
+import selectors
 import socket
-import json
+import multiprocessing
+import orjson
+from multiprocessing.context import BaseContext
+from typing import Optional
+from .counters import SharedCounters
 from .misc import create_logger
 
 
+class TelemetrySnapshot:
+    def __init__(
+        self, telemetry: dict, size: int = 65536, context: Optional[BaseContext] = None
+    ) -> None:
+        """
+        Latest telemetry, held in shared memory as serialized JSON. Written by the data
+        gatherer and read by the telemetry server, which sends it to clients as is.
+
+        :param telemetry: Initial telemetry
+        :param size: Maximum size of the serialized telemetry in bytes
+        :param context: Multiprocessing context of the processes sharing the snapshot
+        :rtype: None
+        """
+        context = context or multiprocessing.get_context()
+        self._buffer = context.Array("c", size)
+        self._length = context.RawValue("I", 0)
+        self.publish(telemetry)
+
+    def publish(self, telemetry: dict) -> None:
+        """
+        :param telemetry: Telemetry to replace the current snapshot with
+        :rtype: None
+        """
+        payload = orjson.dumps(telemetry)
+        if len(payload) > len(self._buffer):
+            raise ValueError(
+                f"Telemetry of {len(payload)} bytes does not fit in a "
+                f"{len(self._buffer)} byte snapshot"
+            )
+
+        with self._buffer.get_lock():
+            self._buffer.get_obj()[: len(payload)] = payload
+            self._length.value = len(payload)
+
+    def read(self) -> bytes:
+        """
+        :return: Returns the current snapshot as serialized JSON
+        :rtype: bytes
+        """
+        with self._buffer.get_lock():
+            return self._buffer.get_obj()[: self._length.value]
+
+
 class TelemetryManager:
-    def __init__(self, shared_telemetry):
+    def __init__(self, shared_telemetry: TelemetrySnapshot):
         self.shared_telemetry = shared_telemetry
 
         self.data_stats = {
-            'gatherers': {
-                'total': 0,
-                'rate': 0.0
-            },
-            'processors': {
-                'total': 0,
-                'rate': 0.0
-            },
-            'recorders': {
-                'total': 0,
-                'rate': 0.0
-            }
+            "gatherers": {"total": 0, "rate": 0.0},
+            "recorders": {"total": 0, "rate": 0.0},
         }
 
         self.server_stats = {}
 
         self.datastream_stats = {}
 
-    def _get_data_totals(self, gatherers, processors, recorders) -> tuple:
+    def _get_data_totals(self, gatherers, recorders) -> tuple:
         total_data_gathered = gatherers.telemetry["action_count"]
-        total_data_processed = processors.telemetry["action_count"]
         total_data_recorded = recorders.telemetry["action_count"]
 
-        return total_data_gathered, total_data_processed, total_data_recorded
+        return total_data_gathered, total_data_recorded
 
-    def _calculate_rates(self, gatherers, processors, recorders, interval):
-        (
-            total_data_gathered,
-            total_data_processed,
-            total_data_recorded,
-        ) = self._get_data_totals(gatherers, processors, recorders)
+    def _calculate_rates(self, gatherers, recorders, interval):
+        total_data_gathered, total_data_recorded = self._get_data_totals(
+            gatherers, recorders
+        )
 
         data_gather_rate: float = (
             total_data_gathered - self.data_stats["gatherers"]["total"]
         ) / interval
-        data_process_rate: float = (
-            total_data_processed - self.data_stats["processors"]["total"]
-        ) / interval
         data_record_rate: float = (
             total_data_recorded - self.data_stats["recorders"]["total"]
         ) / interval
 
-        return data_gather_rate, data_process_rate, data_record_rate
+        return data_gather_rate, data_record_rate
 
-    def update_data_stats(self, gatherers, processors, recorders, interval):
-        data_gathered, data_processed, data_recorded = self._get_data_totals(
-            gatherers, processors, recorders
-        )
-        gather_rate, process_rate, record_rate = self._calculate_rates(
-            gatherers, processors, recorders, interval
-        )
+    def update_data_stats(self, gatherers, recorders, interval):
+        data_gathered, data_recorded = self._get_data_totals(gatherers, recorders)
+        gather_rate, record_rate = self._calculate_rates(gatherers, recorders, interval)
 
-        self.data_stats['gatherers'] = {'total': data_gathered, 'rate': gather_rate}
-        self.data_stats['processors'] = {'total': data_processed, 'rate': process_rate}
-        self.data_stats['recorders'] = {'total': data_recorded, 'rate': record_rate}
+        self.data_stats["gatherers"] = {"total": data_gathered, "rate": gather_rate}
+        self.data_stats["recorders"] = {"total": data_recorded, "rate": record_rate}
 
-    def update_server_stats(self, gatherers, processors, recorders, unsaved_queue, unprocessed_queue, uptime):
-        self.server_stats['proc_counts'] = {
-            'gatherers': gatherers.proc_count(),
-            'processors': processors.proc_count(),
-            'recorders': recorders.proc_count()
+    def update_server_stats(self, gatherers, recorders, unsaved_queue, uptime):
+        self.server_stats["proc_counts"] = {
+            "gatherers": gatherers.proc_count(),
+            "recorders": recorders.proc_count(),
         }
 
-        self.server_stats['queues'] = {
-            'unprocessed': {
-                'size': unprocessed_queue.qsize(),
-                'average': processors.queue_average
-            },
-            'unsaved': {
-                'size': unsaved_queue.qsize(),
-                'average': recorders.queue_average
+        self.server_stats["queues"] = {
+            "unsaved": {
+                "size": unsaved_queue.qsize(),
+                "average": recorders.queue_average,
             }
         }
 
-        self.server_stats['uptime'] = uptime
+        self.server_stats["uptime"] = uptime
 
-    def update_instrument_stats(self, processors, interval):
-        for instrument, count in processors.telemetry.items():
-            if instrument == 'action_count':
+    def update_instrument_stats(self, gatherers, interval):
+        for instrument, count in gatherers.telemetry.items():
+            if instrument == "action_count":
                 continue
 
             rate = 0
             if instrument in self.datastream_stats:
-                previous = self.datastream_stats[instrument]['count']
+                previous = self.datastream_stats[instrument]["count"]
                 rate = (count - previous) / interval
 
-            self.datastream_stats[instrument] = {
-                'count': count,
-                'rate': rate
-            }
+            self.datastream_stats[instrument] = {"count": count, "rate": rate}
 
     def update_shared_telemetry(self):
-        self.shared_telemetry['data'] = self.data_stats
-        self.shared_telemetry['server'] = self.server_stats
-        self.shared_telemetry['datastream'] = self.datastream_stats
+        self.shared_telemetry.publish(
+            {
+                "data": self.data_stats,
+                "server": self.server_stats,
+                "datastream": self.datastream_stats,
+            }
+        )
 
 
 telemetry_format = {
     "data": {
         "gatherers": {"total": -1, "rate": -1.0},
-        "processors": {"total": -1, "rate": -1.0},
         "recorders": {"total": -1, "rate": -1.0},
     },
     "server": {
-        "proc_counts": {"gatherers": -1, "processors": -1, "recorders": -1},
+        "proc_counts": {"gatherers": -1, "recorders": -1},
         "queues": {
-            "unprocessed": {"size": -1, "average": -1},
             "unsaved": {"size": -1, "average": -1},
         },
         "uptime": -1,
@@ -122,8 +144,16 @@ telemetry_format = {
 }
 
 
-def expose_telemetry(exposed_telemetry: dict, telemetry: dict = None) -> None:
-    logger = create_logger()
+def expose_telemetry(
+    exposed_telemetry: TelemetrySnapshot,
+    log_queue=None,
+    telemetry: SharedCounters = None,
+) -> None:
+    logger = create_logger(log_queue)
+    # Telemetry is served on request only, give way to the data pipeline for CPU time
+    if hasattr(os, "nice"):
+        os.nice(10)
+
     host = "127.0.0.1"
     port = 65001  # TODO: Auto-assign port to avoid collision with other software
 
@@ -134,23 +164,42 @@ def expose_telemetry(exposed_telemetry: dict, telemetry: dict = None) -> None:
 
     # Configure how many client the server can listen simultaneously
     server_socket.listen(10)
-    while True:
-        logger.info("Waiting for client...")
-        conn, address = server_socket.accept()
+    server_socket.setblocking(False)
 
-        while True:
-            # Data does not matter, server always responds with telemetry data
-            data = conn.recv(1024).decode()
-            if not data:
-                break
+    # Serve every client from one loop, a slow client only delays its own replies
+    selector = selectors.DefaultSelector()
+    selector.register(server_socket, selectors.EVENT_READ)
+    send_timeout = 1.0
 
-            response = json.dumps(
-                exposed_telemetry.copy()
-            )  # Must copy as shared dict is not JSON serializable
-            conn.send(response.encode("utf-8"))
-            logger.info("Served telemetry data.")
-
-        if telemetry is not None:
-            telemetry["action_count"] += 1
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is server_socket:
+                try:
+                    conn, address = server_socket.accept()
+                except BlockingIOError:
+                    # Client disconnected before it was accepted
+                    continue
+
+                # Only readable clients are read from, the timeout bounds sends to clients
+                # that stop reading
+                conn.settimeout(send_timeout)
+                selector.register(conn, selectors.EVENT_READ)
+                logger.info(f"Accepted client {address[0]}:{address[1]}")
+                continue
 
-        conn.close()
+            conn = key.fileobj
+            try:
+                # Data does not matter, server always responds with telemetry data
+                data = conn.recv(1024)
+                if data:
+                    conn.sendall(exposed_telemetry.read())
+                    logger.info("Served telemetry data.")
+                    continue
+            except OSError as error:
+                logger.warning(f"Dropping telemetry client: {error}")
+
+            selector.unregister(conn)
+            conn.close()
+
+            if telemetry is not None:
+                telemetry.add("action_count")
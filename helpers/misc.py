@@ -1,11 +1,14 @@
 import configparser
 import logging
 import multiprocessing
+import os
+import signal
 import sys
 
 from functools import wraps
-from logging.handlers import RotatingFileHandler
-from typing import Callable, Union
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from multiprocessing.context import BaseContext
+from typing import Callable, List, Optional, Union
 
 
 def load_config(file: str = "cfg.ini") -> dict:
@@ -39,27 +42,17 @@ def seconds_to_human(s: float) -> str:
     if s == 0:
         return "0s"
 
-    M = 60
-    H = M * 60
-    D = H * 24
-    W = D * 7
+    w, s = divmod(s, 604800)
+    d, s = divmod(s, 86400)
+    h, s = divmod(s, 3600)
+    m, s = divmod(s, 60)
 
-    w = s // W
-    s = s - (w * W)
-    d = s // D
-    s = s - (d * D)
-    h = s // H
-    s = s - (h * H)
-    m = s // M
-    s = s - (m * M)
-
-    times = {"w": w, "d": d, "h": h, "m": m, "s": s}
-    parts = [f"{val}{key}" for key, val in times.items() if val > 0]
-    return " ".join(parts)
+    times = (("w", w), ("d", d), ("h", h), ("m", m), ("s", s))
+    return " ".join([f"{val}{key}" for key, val in times if val > 0])
 
 
 def seconds_to_us(seconds: float) -> int:
-    return int(seconds * 10 ** 6)
+    return int(seconds * 10**6)
 
 
 def ignore_keyboard_interrupt(func: Callable) -> Callable:
@@ -80,7 +73,34 @@ def ignore_keyboard_interrupt(func: Callable) -> Callable:
     return wrapper
 
 
-def moving_average(previous: Union[int, float], new: Union[int, float], count: int) -> Union[int, float]:
+class TerminationFlag:
+    def __init__(self) -> None:
+        """
+        Flag which is set once the process receives SIGTERM. Worker loops check it between
+        queue operations, since exiting in the middle of one leaves shared queues inconsistent.
+
+        :rtype: None
+        """
+        self.terminated = False
+        signal.signal(signal.SIGTERM, self._terminate)
+
+    def _terminate(self, signum, frame) -> None:
+        """
+        :rtype: None
+        """
+        self.terminated = True
+
+    def __bool__(self) -> bool:
+        """
+        :return: Returns whether SIGTERM has been received
+        :rtype: bool
+        """
+        return self.terminated
+
+
+def moving_average(
+    previous: Union[int, float], new: Union[int, float], count: int
+) -> Union[int, float]:
     """
     :param previous: Previous value of moving average
     :param new: New value of data for which to average
@@ -91,28 +111,63 @@ def moving_average(previous: Union[int, float], new: Union[int, float], count: i
     return previous * (count / (count + 1)) + new * (1 / (count + 1))
 
 
-def create_logger() -> logging.Logger:
+def _create_log_handlers() -> List[logging.Handler]:
     """
-    :return: Returns a logger object
-    :rtype: logging.Logger
+    :return: Returns the log file handler, and a stdout handler for warnings and above
+    :rtype: List[logging.Handler]
     """
-    logger = multiprocessing.get_logger()
-    logger.setLevel(logging.INFO)
     formatter = logging.Formatter(
         "[%(asctime)s| %(levelname)s| %(processName)s] %(message)s"
     )
-    handler = RotatingFileHandler("logs/log.log", mode='a', maxBytes=100_000_000, backupCount=3)
+    os.makedirs("logs", exist_ok=True)
+    handler = RotatingFileHandler(
+        "logs/log.log", mode="a", maxBytes=100_000_000, backupCount=3
+    )
     handler.setFormatter(formatter)
 
-    if len(logger.handlers) < 1:
-        logger.addHandler(handler)
-
     out_handler = logging.StreamHandler(sys.stdout)
     out_handler.setFormatter(formatter)
     out_handler.setLevel(logging.WARNING)
 
-    if len(logger.handlers) < 2:
-        logger.addHandler(out_handler)
+    return [handler, out_handler]
 
-    return logger
 
+def create_log_listener(context: Optional[BaseContext] = None) -> QueueListener:
+    """
+    Listener owning the log file and stdout handlers. Loggers created with its queue only
+    push records onto the queue, and the listener's thread writes them out.
+
+    :param context: Multiprocessing context of the processes logging to the listener
+    :return: Returns a log listener, which must be started before use
+    :rtype: QueueListener
+    """
+    log_queue = (context or multiprocessing.get_context()).Queue()
+    return QueueListener(log_queue, *_create_log_handlers(), respect_handler_level=True)
+
+
+def create_logger(log_queue: Optional[multiprocessing.Queue] = None) -> logging.Logger:
+    """
+    :param log_queue: Queue of a log listener to send records to, see create_log_listener
+    :return: Returns a logger object
+    :rtype: logging.Logger
+    """
+    logger = multiprocessing.get_logger()
+    logger.setLevel(logging.INFO)
+
+    if log_queue is not None:
+        # Replaces any handlers, including those inherited from a forked parent
+        if not any(
+            isinstance(h, QueueHandler) and h.queue is log_queue
+            for h in logger.handlers
+        ):
+            logger.handlers = [QueueHandler(log_queue)]
+
+        return logger
+
+    if len(logger.handlers) > 0:
+        return logger
+
+    for handler in _create_log_handlers():
+        logger.addHandler(handler)
+
+    return logger
@@ -0,0 +1,164 @@
+import os
+import queue
+import struct
+import multiprocessing
+
+from multiprocessing import shared_memory
+from multiprocessing.context import BaseContext
+from typing import List, Optional, Sequence
+
+
+class RingQueue:
+    HEADER = struct.Struct("I")
+
+    def __init__(
+        self,
+        capacity: int = 4096,
+        slot_size: int = 4096,
+        context: Optional[BaseContext] = None,
+    ) -> None:
+        """
+        Process-safe FIFO queue backed by a ring of fixed-size slots in shared memory.
+        Items are copied straight into the ring by the calling process, avoiding the
+        feeder thread and pipe used by multiprocessing.Queue.
+
+        :param capacity: Maximum number of items held in the queue
+        :param slot_size: Size of each slot in bytes, bounds the size of a serialized item
+        :param context: Multiprocessing context of the processes sharing the queue
+        :rtype: None
+        """
+        self.capacity = capacity
+        self.slot_size = slot_size
+
+        self._shm = shared_memory.SharedMemory(create=True, size=capacity * slot_size)
+        self._owner_pid = os.getpid()
+
+        # Total number of items ever read (head) and written (tail)
+        context = context or multiprocessing.get_context()
+        self._cursors = context.RawArray("Q", 2)
+        self._lock = context.Lock()
+        self._items = context.Semaphore(0)
+        self._free_slots = context.Semaphore(capacity)
+
+    def _write_slot(self, index: int, payload: bytes) -> None:
+        """
+        Slots hold a length header followed by the payload. Must be called with the lock held.
+
+        :param index: Cursor position of the slot to write
+        :param payload: Bytes to write into the slot
+        :rtype: None
+        """
+        offset = (index % self.capacity) * self.slot_size
+        RingQueue.HEADER.pack_into(self._shm.buf, offset, len(payload))
+        start = offset + RingQueue.HEADER.size
+        self._shm.buf[start : start + len(payload)] = payload
+
+    def _read_slot(self, index: int) -> bytes:
+        """
+        Must be called with the lock held.
+
+        :param index: Cursor position of the slot to read
+        :return: Returns the payload written into the slot by _write_slot
+        :rtype: bytes
+        """
+        offset = (index % self.capacity) * self.slot_size
+        (length,) = RingQueue.HEADER.unpack_from(self._shm.buf, offset)
+        start = offset + RingQueue.HEADER.size
+        return bytes(self._shm.buf[start : start + length])
+
+    def put_bytes(
+        self, payload: bytes, block: bool = True, timeout: Optional[float] = None
+    ) -> None:
+        """
+        Adds serialized data to the queue.
+
+        :param payload: Bytes to add to the queue
+        :param block: Whether to wait for a free slot if the queue is full
+        :param timeout: Maximum number of seconds to wait for a free slot
+        :rtype: None
+        """
+        self.put_many_bytes((payload,), block, timeout)
+
+    def put_many_bytes(
+        self,
+        payloads: Sequence[bytes],
+        block: bool = True,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """
+        Adds several serialized items to the queue, in order, under a single lock
+        acquisition. Either every item is added or, if the queue stays full, none are.
+
+        :param payloads: Bytes of each item to add to the queue
+        :param block: Whether to wait for free slots if the queue is full
+        :param timeout: Maximum number of seconds to wait for each free slot
+        :rtype: None
+        """
+        for payload in payloads:
+            if RingQueue.HEADER.size + len(payload) > self.slot_size:
+                raise ValueError(
+                    f"Item of {len(payload)} bytes does not fit in a {self.slot_size} byte slot"
+                )
+
+        for acquired in range(len(payloads)):
+            if not self._free_slots.acquire(block, timeout):
+                for _ in range(acquired):
+                    self._free_slots.release()
+                raise queue.Full
+
+        with self._lock:
+            tail = self._cursors[1]
+            for index, payload in enumerate(payloads, tail):
+                self._write_slot(index, payload)
+            self._cursors[1] = tail + len(payloads)
+
+        for _ in payloads:
+            self._items.release()
+
+    def get_many_bytes(
+        self, max_items: int, block: bool = True, timeout: Optional[float] = None
+    ) -> List[bytes]:
+        """
+        Waits for one item, then also takes any further items already in the
+        queue, so a burst costs a single lock acquisition.
+
+        :param max_items: Maximum number of items to return
+        :param block: Whether to wait for an item if the queue is empty
+        :param timeout: Maximum number of seconds to wait for an item
+        :return: Returns up to max_items of the oldest items in the queue, oldest first
+        :rtype: List[bytes]
+        """
+        if not self._items.acquire(block, timeout):
+            raise queue.Empty
+
+        count = 1
+        while count < max_items and self._items.acquire(False):
+            count += 1
+
+        with self._lock:
+            head = self._cursors[0]
+            payloads = [self._read_slot(index) for index in range(head, head + count)]
+            self._cursors[0] = head + count
+
+        for _ in range(count):
+            self._free_slots.release()
+
+        return payloads
+
+    def qsize(self) -> int:
+        """
+        :return: Returns the approximate number of items in the queue
+        :rtype: int
+        """
+        head = self._cursors[0]
+        return self._cursors[1] - head
+
+    def close(self) -> None:
+        """
+        Releases the shared memory, which is destroyed once the creating process closes it.
+
+        :rtype: None
+        """
+        self._shm.close()
+        if os.getpid() == self._owner_pid:
+            self._shm.unlink()